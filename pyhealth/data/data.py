@@ -1,3 +1,4 @@
+import sys
 from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, List
@@ -58,7 +59,9 @@ class Event:
     ):
         assert timestamp is None or isinstance(timestamp, datetime), \
             "timestamp must be a datetime object"
-        self.code = code
+        # the same codes repeat across millions of events, interning keeps a single
+        # copy of each code string in memory (and in the pickled dataset cache)
+        self.code = sys.intern(code) if isinstance(code, str) else code
         self.table = table
         self.vocabulary = vocabulary
         self.visit_id = visit_id
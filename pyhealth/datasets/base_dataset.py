@@ -1,7 +1,10 @@
 import os
+import sys
 from abc import ABC, abstractmethod
 from copy import deepcopy
 from datetime import datetime
+from functools import partial
+from multiprocessing import Pool
 from typing import Optional, List, Dict, Callable
 
 from torch.utils.data import Dataset
@@ -16,6 +19,30 @@ MODULE_CACHE_PATH = os.path.join(BASE_CACHE_PATH, "datasets")
 create_directory(MODULE_CACHE_PATH)
 
 
+def _collect_samples(task_fn: Callable, patient: Patient) -> List[Dict]:
+    """Applies task_fn to a patient and collects the samples into a list.
+
+    Task functions may be generators, which cannot be sent back from the worker
+    processes of set_task(), so the samples are materialized in the worker.
+    """
+    return list(task_fn(patient))
+
+
+def _intern_strings(value):
+    """Interns the strings in a sample returned by a worker process of set_task().
+
+    Samples come back from the workers as unpickled copies; interning maps their
+    codes back to the (interned) code strings of the events in the main process.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern_strings(v) for v in value]
+    if isinstance(value, dict):
+        return {_intern_strings(k): _intern_strings(v) for k, v in value.items()}
+    return value
+
+
 class BaseDataset(ABC, Dataset):
     """Abstract base dataset class.
 
@@ -254,6 +281,7 @@ class BaseDataset(ABC, Dataset):
         self,
         task_fn: Callable,
         task_name: Optional[str] = None,
+        num_workers: int = 1,
     ) -> None:
         """Processes the base dataset to generate the task-specific samples.
 
@@ -263,11 +291,20 @@ class BaseDataset(ABC, Dataset):
 
         Args:
             task_fn: function, a function that takes a single patient and returns
-                a list of samples (each sample is a dict with patient_id, visit_id,
-                and other task-specific attributes as key). The samples will be
-                concatenated to form the final samples of the task dataset.
+                a list of samples or yields samples (each sample is a dict with
+                patient_id, visit_id, and other task-specific attributes as key). The
+                samples will be concatenated to form the final samples of the task
+                dataset.
             task_name: str, the name of the task. If None, the name of the task
                 function will be used.
+            num_workers: int, number of worker processes to apply task_fn with.
+                Patients are processed independently, so with num_workers > 1 they
+                are distributed over a process pool; task_fn must then be picklable
+                (e.g., a module-level function, not a lambda). The samples sent back
+                by the workers are copies; their strings are interned again in the
+                main process so that they share the code strings of the events, at
+                the cost of one extra pass over the samples. Default is 1, which
+                processes the patients in the current process.
 
         Returns:
             samples: a list of samples, each sample is a dict with patient_id,
@@ -283,10 +320,27 @@ class BaseDataset(ABC, Dataset):
         self.task = task_name
         self.task_fn = task_fn
         samples = []
-        for patient_id, patient in tqdm(
-            self.patients.items(), desc=f"Generating samples for {self.task}"
-        ):
-            samples.extend(self.task_fn(patient))
+        if num_workers > 1:
+            # hand out patients in chunks to amortize the inter-process overhead
+            chunksize = max(1, len(self.patients) // (num_workers * 4))
+            with Pool(num_workers) as pool:
+                for patient_samples in tqdm(
+                    pool.imap(
+                        partial(_collect_samples, self.task_fn),
+                        self.patients.values(),
+                        chunksize,
+                    ),
+                    total=len(self.patients),
+                    desc=f"Generating samples for {self.task}",
+                ):
+                    samples.extend(
+                        _intern_strings(sample) for sample in patient_samples
+                    )
+        else:
+            for patient_id, patient in tqdm(
+                self.patients.items(), desc=f"Generating samples for {self.task}"
+            ):
+                samples.extend(self.task_fn(patient))
         self.samples = samples
         self.patient_to_index = self._index_patient()
         self.visit_to_index = self._index_visit()
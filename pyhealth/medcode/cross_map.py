@@ -1,7 +1,10 @@
 import os
-from collections import defaultdict
+from collections.abc import Mapping
 from urllib.error import HTTPError
 
+import numpy as np
+import pandas as pd
+
 import pyhealth.medcode as medcode
 from pyhealth import BASE_CACHE_PATH
 from pyhealth.medcode.utils import download_and_read_csv
@@ -12,6 +15,89 @@ MODULE_CACHE_PATH = os.path.join(BASE_CACHE_PATH, "medcode")
 create_directory(MODULE_CACHE_PATH)
 
 
+class MemmapMapping(Mapping):
+    """read-only mapping from source code to target codes backed by memory-mapped files
+
+    The target codes of all source codes are concatenated into one utf-8 byte buffer
+    and delimited by an offsets array. Both arrays are memory-mapped, so the codes
+    are only decoded when looked up and processes loading the same mapping share
+    the OS page cache instead of each rebuilding millions of Python lists. Only the
+    small index from source code to its range of target codes is unpickled.
+
+    Decoding an entry from the buffers is much slower than a dict lookup, so decoded
+    entries are memoized per instance; only the codes that are actually looked up
+    (typically a small part of the mapping) are ever held as Python objects.
+
+    Parameters:
+        filepath: str, path prefix of the cache files (without extension)
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.index = load_pickle(filepath + ".index.pkl")
+        self.buffer = np.load(filepath + ".buffer.npy", mmap_mode="r")
+        self.offsets = np.load(filepath + ".offsets.npy", mmap_mode="r")
+        # source code -> decoded tuple of target codes, filled on first access
+        self._decoded = {}
+
+    def __reduce__(self):
+        # reopen the files by path instead of pickling in-memory copies of the
+        # memory-mapped arrays
+        return MemmapMapping, (self.filepath,)
+
+    @staticmethod
+    def save(mapping, filepath):
+        index = {}
+        encoded = []
+        offsets = [0]
+        for src_code, tgt_codes in mapping.items():
+            start = len(encoded)
+            for tgt_code in tgt_codes:
+                encoded.append(tgt_code.encode("utf-8"))
+                offsets.append(offsets[-1] + len(encoded[-1]))
+            index[src_code] = (start, len(encoded))
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        np.save(filepath + ".buffer.npy", buffer)
+        np.save(filepath + ".offsets.npy", np.array(offsets, dtype=np.int64))
+        save_pickle(index, filepath + ".index.pkl")
+
+    @staticmethod
+    def exists(filepath):
+        return all(
+            os.path.exists(filepath + ext)
+            for ext in [".index.pkl", ".buffer.npy", ".offsets.npy"]
+        )
+
+    def __getitem__(self, src_code):
+        tgt_codes = self._decoded.get(src_code)
+        if tgt_codes is None:
+            start, end = self.index[src_code]
+            offsets = self.offsets[start:end + 1].tolist()
+            tgt_codes = tuple(
+                self.buffer[a:b].tobytes().decode("utf-8")
+                for a, b in zip(offsets[:-1], offsets[1:])
+            )
+            self._decoded[src_code] = tgt_codes
+        return tgt_codes
+
+    def get(self, src_code, default=None):
+        tgt_codes = self._decoded.get(src_code)
+        if tgt_codes is not None:
+            return tgt_codes
+        if src_code not in self.index:
+            return default
+        return self[src_code]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, src_code):
+        return src_code in self.index
+
+
 class CrossMap:
     """mapping function cross two coding systems
 
@@ -22,15 +108,15 @@ class CrossMap:
         **kwargs: dict, additional arguments for postprocessing
 
     Attributes:
-        mapping: dict, mapping from source code to target codes. To make the format consistent, the key 
-            is a string-based source code and the value is a list of string-based target codes.
+        mapping: MemmapMapping, mapping from source code to target codes. To make the format consistent,
+            the key is a string-based source code and the value is a tuple of string-based target codes.
         src_class: object, source coding system class
         tgt_class: object, target coding system class
             
     **Examples:**
         >>> from pyhealth.medcode import CrossMap
         >>> mapping = CrossMap("ICD9CM", "CCSCM")
-        Loaded ICD9CM->CCSCM mapping from /home/chaoqiy2/.cache/pyhealth/medcode/ICD9CM_to_CCSCM.pkl
+        Loaded ICD9CM->CCSCM mapping from /home/chaoqiy2/.cache/pyhealth/medcode/ICD9CM_to_CCSCM
         Loaded ICD9CM code from /home/chaoqiy2/.cache/pyhealth/medcode/ICD9CM.pkl
         Loaded CCSCM code from /home/chaoqiy2/.cache/pyhealth/medcode/CCSCM.pkl
         <pyhealth.medcode.cross_map.CrossMap object at 0x7f7f968a7ca0>
@@ -39,11 +125,13 @@ class CrossMap:
         
         >>> mapping = CrossMap(src_vocab="RxNorm", tgt_vocab="NDC")
         Processing RxNorm->NDC mapping...
-        Saved RxNorm->NDC mapping to /root/.cache/pyhealth/medcode/RxNorm_to_NDC.pkl
+        Saved RxNorm->NDC mapping to /root/.cache/pyhealth/medcode/RxNorm_to_NDC
         Loaded RxNorm code from /root/.cache/pyhealth/medcode/RxNorm.pkl
         Loaded NDC code from /root/.cache/pyhealth/medcode/NDC.pkl
         >>> mapping.map("209387")
         ['00045045270', '00045049642', '00045049650', .., '705182798', '70518279800']
+        >>> mapping.map_batch(["209387", "000000"])
+        [['00045045270', '00045049642', .., '70518279800'], []]
     
     """
     
@@ -63,16 +151,21 @@ class CrossMap:
         self.src_class = getattr(medcode, src_vocab)()
         self.tgt_class = getattr(medcode, tgt_vocab)()
 
+        # the same codes repeat across patients and visits, so memoize the
+        # per-code standardization and postprocessing (plain dicts, so that
+        # CrossMap stays picklable)
+        self._std_cache = {}
+        self._post_cache = {}
+
         return
 
     def load_mapping(self, refresh_cache: bool = False):
-        pickle_filename = f"{self.src_vocab}_to_{self.tgt_vocab}.pkl"
-        pickle_filepath = os.path.join(MODULE_CACHE_PATH, pickle_filename)
+        cache_filename = f"{self.src_vocab}_to_{self.tgt_vocab}"
+        cache_filepath = os.path.join(MODULE_CACHE_PATH, cache_filename)
 
-        if os.path.exists(pickle_filepath) and (not refresh_cache):
+        if MemmapMapping.exists(cache_filepath) and (not refresh_cache):
             print(f"Loaded {self.src_vocab}->{self.tgt_vocab} mapping "
-                  f"from {pickle_filepath}")
-            mapping = load_pickle(pickle_filepath)
+                  f"from {cache_filepath}")
         else:
             print(f"Processing {self.src_vocab}->{self.tgt_vocab} mapping...")
             try:
@@ -81,21 +174,63 @@ class CrossMap:
             except HTTPError:
                 local_filename = f"{self.tgt_vocab}_to_{self.src_vocab}.csv"
                 df = download_and_read_csv(local_filename, refresh_cache)
-            mapping = defaultdict(list)
-            for _, row in df.iterrows():
-                mapping[row[self.src_vocab]].append(row[self.tgt_vocab])
+            df = df.dropna(subset=[self.src_vocab, self.tgt_vocab])
+            mapping = {}
+            # itertuples avoids building a Series for every row
+            for src_code, tgt_code in df[[self.src_vocab, self.tgt_vocab]].itertuples(
+                    index=False, name=None
+            ):
+                mapping.setdefault(src_code, []).append(tgt_code)
             print(f"Saved {self.src_vocab}->{self.tgt_vocab} mapping "
-                  f"to {pickle_filepath}")
-            save_pickle(mapping, pickle_filepath)
-
-        return mapping
+                  f"to {cache_filepath}")
+            MemmapMapping.save(mapping, cache_filepath)
+
+        return MemmapMapping(cache_filepath)
+
+    def _standardize(self, code):
+        try:
+            return self._std_cache[code]
+        except KeyError:
+            std_code = self._std_cache[code] = self.src_class.standardize(code)
+            return std_code
+
+    def _postprocess(self, code):
+        try:
+            return self._post_cache[code]
+        except KeyError:
+            post_code = self._post_cache[code] = self.tgt_class.postprocess(
+                code, **self.kwargs
+            )
+            return post_code
 
     def map(self, src_code):
-        src_code = self.src_class.standardize(src_code)
-        tgt_codes = self.mapping[src_code]
-        tgt_codes = [self.tgt_class.postprocess(c, **self.kwargs) for c in tgt_codes]
+        src_code = self._standardize(src_code)
+        tgt_codes = self.mapping.get(src_code, ())
+        tgt_codes = [self._postprocess(c) for c in tgt_codes]
         return tgt_codes
 
+    def map_batch(self, src_codes):
+        """maps a list of source codes, returns one list of target codes per code
+
+        A pd.Series of codes (e.g., a column of an event table) is mapped through
+        its distinct codes with Series.map, and the result is a Series of lists
+        with the same index; missing values stay missing.
+        """
+        if isinstance(src_codes, pd.Series):
+            # each distinct code is mapped once, then broadcast to its rows
+            unique_codes = src_codes.dropna().unique()
+            return src_codes.map(
+                dict(zip(unique_codes, self.map_batch(unique_codes.tolist())))
+            )
+        # bind the lookups once instead of resolving them for every code
+        standardize = self._standardize
+        postprocess = self._postprocess
+        mapping_get = self.mapping.get
+        return [
+            [postprocess(c) for c in mapping_get(standardize(src_code), ())]
+            for src_code in src_codes
+        ]
+
 
 if __name__ == "__main__":
     codemap = CrossMap("ICD9CM", "CCSCM")
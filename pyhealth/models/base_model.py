@@ -48,7 +48,12 @@ class BaseModel(ABC, nn.Module):
             y: ground truth
             y_pred: the output of the model
             y_prob: the probability of the output of the model
+
+        The loss is computed from the logits directly, so y_prob and y_pred are only
+        computed in eval mode and are None in training mode.
         """
+        # probabilities are only consumed by evaluation
+        y_prod, y_pred = None, None
         if self.mode in ["multilabel"]:
             kwargs[self.target] = self.label_tokenizer.batch_encode_2d(
                 kwargs[self.target], padding=False, truncation=False
@@ -58,26 +63,36 @@ class BaseModel(ABC, nn.Module):
                 self.label_tokenizer.get_vocabulary_size(),
                 device=device,
             )
-            for idx, sample in enumerate(kwargs[self.target]):
-                y[idx, sample] = 1
+            # set the whole batch of labels with a single indexed assignment
+            rows = [
+                idx for idx, sample in enumerate(kwargs[self.target]) for _ in sample
+            ]
+            cols = [label for sample in kwargs[self.target] for label in sample]
+            y[
+                torch.tensor(rows, dtype=torch.long, device=device),
+                torch.tensor(cols, dtype=torch.long, device=device),
+            ] = 1
 
-            loss = get_default_loss_module(self.mode)(logits, y.to(device))
-            y_prod = torch.sigmoid(logits)
-            y_pred = (y_prod > 0.5).int()
+            loss = get_default_loss_module(self.mode)(logits, y)
+            if not self.training:
+                y_prod = torch.sigmoid(logits)
+                y_pred = (y_prod > 0.5).int()
 
         elif self.mode in ["binary"]:
             y = self.label_tokenizer.convert_tokens_to_indices(kwargs[self.target])
             y = torch.FloatTensor(y)
             loss = get_default_loss_module(self.mode)(logits[:, 0], y.to(device))
-            y_prod = torch.sigmoid(logits)[:, 0]
-            y_pred = (y_prod > 0.5).int()
+            if not self.training:
+                y_prod = torch.sigmoid(logits)[:, 0]
+                y_pred = (y_prod > 0.5).int()
 
         elif self.mode in ["multiclass"]:
             y = self.label_tokenizer.convert_tokens_to_indices(kwargs[self.target])
             y = torch.LongTensor(y)
             loss = get_default_loss_module(self.mode)(logits, y.to(device))
-            y_prod = torch.softmax(logits, dim=-1)
-            y_pred = torch.argmax(y_prod, dim=-1)
+            if not self.training:
+                y_prod = torch.softmax(logits, dim=-1)
+                y_pred = torch.argmax(y_prod, dim=-1)
         else:
             raise ValueError("Invalid mode: {}".format(self.mode))
 
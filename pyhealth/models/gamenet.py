@@ -251,6 +251,8 @@ class GAMENet(BaseModel):
         mode: the mode of the model, "multilabel"
         embedding_dim: the embedding dimension
         hidden_dim: the hidden dimension
+        row_cache_size: number of encoded visits each input tokenizer keeps for reuse across
+            batches (see Tokenizer), 0 disables the cache
     
     **Examples:**
         >>> from pyhealth.datasets import OMOPDataset
@@ -278,6 +280,7 @@ class GAMENet(BaseModel):
         mode: str,
         embedding_dim: int = 128,
         hidden_dim: int = 128,
+        row_cache_size: int = 0,
         **kwargs
     ):
         super(GAMENet, self).__init__(
@@ -295,10 +298,12 @@ class GAMENet(BaseModel):
             self.tokenizers[domain] = Tokenizer(
                 dataset.get_all_tokens(key=domain),
                 special_tokens=["<pad>", "<unk>"],
+                row_cache_size=row_cache_size,
             )
         self.drug_tokenizer = Tokenizer(
             dataset.get_all_tokens(key="drugs"),
             special_tokens=["<pad>", "<unk>"],
+            row_cache_size=row_cache_size,
         )
         self.label_tokenizer = Tokenizer(dataset.get_all_tokens(key=target))
 
@@ -414,7 +419,9 @@ class GAMENet(BaseModel):
         """
         for domain in self.tables:
             if type(kwargs[domain][0][0]) == list:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(kwargs[domain])
+                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(
+                    kwargs[domain], return_numpy=True
+                )
                 kwargs[domain] = torch.tensor(
                     kwargs[domain], dtype=torch.long, device=device
                 )
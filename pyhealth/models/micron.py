@@ -95,6 +95,8 @@ class MICRON(BaseModel):
         mode: the mode of the model, "multilabel", "multiclass" or "binary"
         embedding_dim: the embedding dimension
         hidden_dim: the hidden dimension
+        row_cache_size: number of encoded visits each input tokenizer keeps for reuse across
+            batches (see Tokenizer), 0 disables the cache
     
     **Examples:**
         >>> from pyhealth.datasets import OMOPDataset
@@ -123,6 +125,7 @@ class MICRON(BaseModel):
         mode: str,
         embedding_dim: int = 128,
         hidden_dim: int = 128,
+        row_cache_size: int = 0,
         **kwargs
     ):
         super(MICRON, self).__init__(
@@ -138,7 +141,9 @@ class MICRON(BaseModel):
         self.tokenizers = {}
         for domain in tables:
             self.tokenizers[domain] = Tokenizer(
-                dataset.get_all_tokens(key=domain), special_tokens=["<pad>", "<unk>"]
+                dataset.get_all_tokens(key=domain),
+                special_tokens=["<pad>", "<unk>"],
+                row_cache_size=row_cache_size,
             )
         self.label_tokenizer = Tokenizer(dataset.get_all_tokens(key=target))
 
@@ -165,7 +170,9 @@ class MICRON(BaseModel):
         patient_emb = []
         for domain in self.tables:
             if type(kwargs[domain][0][0]) == list:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(kwargs[domain])
+                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(
+                    kwargs[domain], return_numpy=True
+                )
                 kwargs[domain] = torch.tensor(
                     kwargs[domain], dtype=torch.long, device=device
                 )
@@ -2,6 +2,7 @@ from typing import List, Tuple, Union
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from pyhealth.datasets import BaseDataset
 from pyhealth.models import BaseModel
@@ -17,6 +18,8 @@ class RETAINLayer(nn.Module):
         output_size: the embedding size of the output
         num_layers: the number of layers in the RNN
         dropout: dropout rate
+        use_torch_compile: whether to compile the attention with torch.compile (requires
+            torch>=2.0), which fuses its softmax, tanh, products and sum into fewer kernels
         
     **Examples:**
         >>> from pyhealth.models import RETAINLayer
@@ -33,6 +36,7 @@ class RETAINLayer(nn.Module):
         hidden_size: int,
         num_layers: int = 2,
         dropout: float = 0.5,
+        use_torch_compile: bool = False,
     ):
         super(RETAINLayer, self).__init__()
         self.input_size = input_size
@@ -48,6 +52,45 @@ class RETAINLayer(nn.Module):
         self.alpha_li = nn.Linear(hidden_size, 1)
         self.beta_li = nn.Linear(hidden_size, hidden_size)
 
+        if use_torch_compile and not hasattr(torch, "compile"):
+            raise ValueError("use_torch_compile requires torch>=2.0")
+        self.use_torch_compile = use_torch_compile
+        self._compiled_attention = None
+        if use_torch_compile:
+            self._compiled_attention = torch.compile(self.attention)
+
+    def __getstate__(self):
+        # the compiled function can not be pickled, torch.save(layer) stores the
+        # layer without it and __setstate__ compiles the attention again
+        state = self.__dict__.copy()
+        state["_compiled_attention"] = None
+        return state
+
+    def __setstate__(self, state):
+        super(RETAINLayer, self).__setstate__(state)
+        if self.use_torch_compile:
+            self._compiled_attention = torch.compile(self.attention)
+
+    def _run_grus(self, x: torch.tensor):
+        """Runs the alpha and beta GRUs on the same input.
+
+        The two GRUs are independent, so on GPU the beta GRU is launched on a side
+        stream to overlap with the alpha GRU instead of waiting for it.
+        """
+        if not x.is_cuda:
+            return self.alpha_gru(x)[0], self.beta_gru(x)[0]
+        main_stream = torch.cuda.current_stream(x.device)
+        side_stream = torch.cuda.Stream(device=x.device)
+        side_stream.wait_stream(main_stream)
+        with torch.cuda.stream(side_stream):
+            h, _ = self.beta_gru(x)
+        g, _ = self.alpha_gru(x)
+        main_stream.wait_stream(side_stream)
+        # x is read and h is allocated on the side stream
+        x.record_stream(side_stream)
+        h.record_stream(main_stream)
+        return g, h
+
     def forward(self, x: torch.tensor, mask: torch.tensor):
         """Using the sum of the embedding as the output of the transformer
         Args:
@@ -59,9 +102,23 @@ class RETAINLayer(nn.Module):
         # rnn will only apply dropout between layers
         x = self.dropout_layer(x)
 
-        g, _ = self.alpha_gru(x)  # (patient, seq_len, hidden_size)
-        h, _ = self.beta_gru(x)  # (patient, seq_len, hidden_size)
+        g, h = self._run_grus(x)  # (patient, seq_len, hidden_size) each
+        if self._compiled_attention is not None:
+            return self._compiled_attention(x, g, h)
+        return self.attention(x, g, h)
 
+    def attention(self, x: torch.tensor, g: torch.tensor, h: torch.tensor):
+        """Combines the visits with the alpha and beta attention.
+
+        Kept apart from the GRUs so that it can be compiled on its own; it has no
+        data-dependent control flow.
+        Args:
+            x: [batch size, seq len, input_size]
+            g: output of the alpha GRU [batch size, seq len, hidden_size]
+            h: output of the beta GRU [batch size, seq len, hidden_size]
+        Returns:
+            outputs [batch size, hidden_size]
+        """
         # TOFIX: mask out the visit (by adding a large negative number 1e10)
         # however, it does not work better than not mask out
         attn_g = torch.softmax(self.alpha_li(g), dim=1)  # (patient, seq_len, 1)
@@ -83,6 +140,8 @@ class RETAIN(BaseModel):
         mode: the mode of the model, "multilabel", "multiclass" or "binary"
         embedding_dim: the embedding dimension
         hidden_dim: the hidden dimension
+        row_cache_size: number of encoded visits each input tokenizer keeps for reuse across
+            batches (see Tokenizer), 0 disables the cache
     
     **Examples:**
         >>> from pyhealth.datasets import OMOPDataset
@@ -111,6 +170,7 @@ class RETAIN(BaseModel):
         mode: str,
         embedding_dim: int = 128,
         hidden_dim: int = 128,
+        row_cache_size: int = 0,
         **kwargs
     ):
         super(RETAIN, self).__init__(
@@ -125,7 +185,9 @@ class RETAIN(BaseModel):
         self.tokenizers = {}
         for domain in tables:
             self.tokenizers[domain] = Tokenizer(
-                dataset.get_all_tokens(key=domain), special_tokens=["<pad>", "<unk>"]
+                dataset.get_all_tokens(key=domain),
+                special_tokens=["<pad>", "<unk>"],
+                row_cache_size=row_cache_size,
             )
         self.label_tokenizer = Tokenizer(dataset.get_all_tokens(key=target))
 
@@ -147,6 +209,20 @@ class RETAIN(BaseModel):
             len(tables) * hidden_dim, self.label_tokenizer.get_vocabulary_size()
         )
 
+    @staticmethod
+    def _to_device(indices, device):
+        """Converts the encoded indices to a long tensor on device.
+
+        For GPU devices the tensor is staged in pinned memory, so the host-to-device
+        copy is asynchronous and overlaps with the tokenization of the next domain.
+        """
+        tensor = torch.as_tensor(indices, dtype=torch.long)
+        if device is None:
+            return tensor
+        if torch.device(device).type == "cuda":
+            return tensor.pin_memory().to(device, non_blocking=True)
+        return tensor.to(device)
+
     def forward(self, device, **kwargs):
         """
         if "kwargs[domain][0][0] is list" means "use history", then run visit level RNN
@@ -155,19 +231,34 @@ class RETAIN(BaseModel):
         patient_emb = []
         for domain in self.tables:
             if type(kwargs[domain][0][0]) == list:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(kwargs[domain])
-                kwargs[domain] = torch.tensor(
-                    kwargs[domain], dtype=torch.long, device=device
+                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(
+                    kwargs[domain], return_numpy=True
                 )
-                # (patient, visit, code, embedding_dim)
-                kwargs[domain] = self.embeddings[domain](kwargs[domain])
+                kwargs[domain] = self._to_device(kwargs[domain], device)
                 # (patient, visit, embedding_dim)
-                kwargs[domain] = torch.sum(kwargs[domain], dim=2)
+                # look up and sum the codes of each visit in one embedding_bag
+                # call, without materializing (patient, visit, code, embedding_dim)
+                num_patients, num_visits, num_codes = kwargs[domain].shape
+                if num_codes == 0:
+                    # no visit in the batch has a code of this domain
+                    kwargs[domain] = torch.zeros(
+                        num_patients,
+                        num_visits,
+                        self.embedding_dim,
+                        device=kwargs[domain].device,
+                    )
+                else:
+                    kwargs[domain] = F.embedding_bag(
+                        kwargs[domain].reshape(-1, num_codes),
+                        self.embeddings[domain].weight,
+                        mode="sum",
+                        padding_idx=0,
+                    ).view(num_patients, num_visits, -1)
             elif type(kwargs[domain][0][0]) in [int, str]:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_2d(kwargs[domain])
-                kwargs[domain] = torch.tensor(
-                    kwargs[domain], dtype=torch.long, device=device
+                kwargs[domain] = self.tokenizers[domain].batch_encode_2d(
+                    kwargs[domain], return_numpy=True
                 )
+                kwargs[domain] = self._to_device(kwargs[domain], device)
                 # (patient, code, embedding_dim)
                 kwargs[domain] = self.embeddings[domain](kwargs[domain])
             else:
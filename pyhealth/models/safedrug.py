@@ -275,6 +275,8 @@ class SafeDrug(BaseModel):
         hidden_dim: the hidden dimension
         kp: the keep probability in PID strategy
         target_ddi: the target ddi value
+        row_cache_size: number of encoded visits each input tokenizer keeps for reuse across
+            batches (see Tokenizer), 0 disables the cache
     
     **Examples:**
         >>> from pyhealth.datasets import OMOPDataset
@@ -304,6 +306,7 @@ class SafeDrug(BaseModel):
         hidden_dim: int = 128,
         kp: float = 0.05,
         target_ddi: float = 0.08,
+        row_cache_size: int = 0,
         **kwargs
     ):
         super(SafeDrug, self).__init__(
@@ -320,7 +323,9 @@ class SafeDrug(BaseModel):
         self.tokenizers = {}
         for domain in tables:
             self.tokenizers[domain] = Tokenizer(
-                dataset.get_all_tokens(key=domain), special_tokens=["<pad>", "<unk>"]
+                dataset.get_all_tokens(key=domain),
+                special_tokens=["<pad>", "<unk>"],
+                row_cache_size=row_cache_size,
             )
         self.label_tokenizer = Tokenizer(dataset.get_all_tokens(key=target))
 
@@ -599,7 +604,9 @@ class SafeDrug(BaseModel):
         """
         for domain in self.tables:
             if type(kwargs[domain][0][0]) == list:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(kwargs[domain])
+                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(
+                    kwargs[domain], return_numpy=True
+                )
                 kwargs[domain] = torch.tensor(
                     kwargs[domain], dtype=torch.long, device=device
                 )
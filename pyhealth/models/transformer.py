@@ -87,6 +87,8 @@ class Transformer(BaseModel):
         mode: the mode of the model, "multilabel", "multiclass" or "binary"
         embedding_dim: the embedding dimension
         hidden_dim: the hidden dimension
+        row_cache_size: number of encoded visits each input tokenizer keeps for reuse across
+            batches (see Tokenizer), 0 disables the cache
         
     **Examples:**
         >>> from pyhealth.datasets import OMOPDataset
@@ -114,6 +116,7 @@ class Transformer(BaseModel):
         mode: str,
         embedding_dim: int = 128,
         hidden_dim: int = 128,
+        row_cache_size: int = 0,
         **kwargs
     ):
         super(Transformer, self).__init__(
@@ -128,7 +131,9 @@ class Transformer(BaseModel):
         self.tokenizers = {}
         for domain in tables:
             self.tokenizers[domain] = Tokenizer(
-                dataset.get_all_tokens(key=domain), special_tokens=["<pad>", "<unk>"]
+                dataset.get_all_tokens(key=domain),
+                special_tokens=["<pad>", "<unk>"],
+                row_cache_size=row_cache_size,
             )
         self.label_tokenizer = Tokenizer(dataset.get_all_tokens(key=target))
 
@@ -158,7 +163,9 @@ class Transformer(BaseModel):
         patient_emb = []
         for domain in self.tables:
             if type(kwargs[domain][0][0]) == list:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(kwargs[domain])
+                kwargs[domain] = self.tokenizers[domain].batch_encode_3d(
+                    kwargs[domain], return_numpy=True
+                )
                 kwargs[domain] = torch.tensor(
                     kwargs[domain], dtype=torch.long, device=device
                 )
@@ -167,7 +174,9 @@ class Transformer(BaseModel):
                 # (patient, visit, embedding_dim)
                 kwargs[domain] = torch.sum(kwargs[domain], dim=2)
             elif type(kwargs[domain][0][0]) in [int, str]:
-                kwargs[domain] = self.tokenizers[domain].batch_encode_2d(kwargs[domain])
+                kwargs[domain] = self.tokenizers[domain].batch_encode_2d(
+                    kwargs[domain], return_numpy=True
+                )
                 kwargs[domain] = torch.tensor(
                     kwargs[domain], dtype=torch.long, device=device
                 )
@@ -1,6 +1,11 @@
 from pyhealth.data import Patient
 
 
+# category of each length of stay in days, stays of 15 days or more share the
+# last entry
+LOS_CATEGORIES = (0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8, 8, 8, 8, 8, 9)
+
+
 def categorize_los(days: int):
     """Categorize length of stay into 10 categories.
 
@@ -8,24 +13,63 @@ def categorize_los(days: int):
     the first week, one for stays of over one week but less than two,
     and one for stays of over two weeks.
 
+    The category is read from a lookup table after clamping days to [0, 15]
+    instead of going through a chain of comparisons.
+
     Args:
         days: int, length of stay in days
 
     Returns:
         category: int, category of length of stay
     """
-    # ICU stays shorter than a day
-    if days < 1:
-        return 0
-    # each day of the first week
-    elif 1 <= days <= 7:
-        return days
-    # stays of over one week but less than two
-    elif 7 < days <= 14:
-        return 8
-    # stays of over two weeks
-    else:
-        return 9
+    return LOS_CATEGORIES[min(max(days, 0), 15)]
+
+
+def _length_of_stay_samples(
+    patient: Patient,
+    condition_table: str,
+    procedure_table: str,
+    drug_table: str,
+):
+    """Helper function which generates the length-of-stay samples of a patient.
+
+    Shared by the dataset-specific task functions below, which only differ in the
+    tables the conditions, procedures and drugs are read from.
+
+    Args:
+        patient: a Patient object.
+        condition_table: str, name of the table with the condition codes.
+        procedure_table: str, name of the table with the procedure codes.
+        drug_table: str, name of the table with the drug codes.
+
+    Yields:
+        sample: a dict with patient_id, visit_id, and other task-specific attributes
+            as key.
+    """
+    patient_id = patient.patient_id
+
+    for visit in patient:
+
+        conditions = visit.get_code_list(table=condition_table)
+        procedures = visit.get_code_list(table=procedure_table)
+        drugs = visit.get_code_list(table=drug_table)
+        # exclude: visits without condition, procedure, and drug code
+        if not (conditions or procedures or drugs):
+            continue
+
+        los_days = (visit.discharge_time - visit.encounter_time).days
+        los_category = categorize_los(los_days)
+
+        # TODO: should also exclude visit with age < 18
+        yield {
+            "visit_id": visit.visit_id,
+            "patient_id": patient_id,
+            "conditions": [conditions],
+            "procedures": [procedures],
+            "drugs": [drugs],
+            "label": los_category,
+        }
+    # no cohort selection
 
 
 def length_of_stay_prediction_mimic3_fn(patient: Patient):
@@ -58,33 +102,14 @@ def length_of_stay_prediction_mimic3_fn(patient: Patient):
         [{'visit_id': '130744', 'patient_id': '103', 'conditions': [['42', '109', '19', '122', '98', '663', '58', '51']], 'procedures': [['1']], 'label': 4}]
         
     """
-    samples = []
-
-    for visit in patient:
-
-        conditions = visit.get_code_list(table="DIAGNOSES_ICD")
-        procedures = visit.get_code_list(table="PROCEDURES_ICD")
-        drugs = visit.get_code_list(table="PRESCRIPTIONS")
-        # exclude: visits without condition, procedure, and drug code
-        if len(conditions) + len(procedures) + len(drugs) == 0:
-            continue
-
-        los_days = (visit.discharge_time - visit.encounter_time).days
-        los_category = categorize_los(los_days)
-
-        # TODO: should also exclude visit with age < 18
-        samples.append(
-            {
-                "visit_id": visit.visit_id,
-                "patient_id": patient.patient_id,
-                "conditions": [conditions],
-                "procedures": [procedures],
-                "drugs": [drugs],
-                "label": los_category,
-            }
+    return list(
+        _length_of_stay_samples(
+            patient,
+            condition_table="DIAGNOSES_ICD",
+            procedure_table="PROCEDURES_ICD",
+            drug_table="PRESCRIPTIONS",
         )
-    # no cohort selection
-    return samples
+    )
 
 
 def length_of_stay_prediction_mimic4_fn(patient: Patient):
@@ -118,33 +143,14 @@ def length_of_stay_prediction_mimic4_fn(patient: Patient):
         
         
     """
-    samples = []
-
-    for visit in patient:
-
-        conditions = visit.get_code_list(table="diagnoses_icd")
-        procedures = visit.get_code_list(table="procedures_icd")
-        drugs = visit.get_code_list(table="prescriptions")
-        # exclude: visits without condition, procedure, and drug code
-        if len(conditions) + len(procedures) + len(drugs) == 0:
-            continue
-
-        los_days = (visit.discharge_time - visit.encounter_time).days
-        los_category = categorize_los(los_days)
-
-        # TODO: should also exclude visit with age < 18
-        samples.append(
-            {
-                "visit_id": visit.visit_id,
-                "patient_id": patient.patient_id,
-                "conditions": [conditions],
-                "procedures": [procedures],
-                "drugs": [drugs],
-                "label": los_category,
-            }
+    return list(
+        _length_of_stay_samples(
+            patient,
+            condition_table="diagnoses_icd",
+            procedure_table="procedures_icd",
+            drug_table="prescriptions",
         )
-    # no cohort selection
-    return samples
+    )
 
 
 def length_of_stay_prediction_eicu_fn(patient: Patient):
@@ -179,33 +185,14 @@ def length_of_stay_prediction_eicu_fn(patient: Patient):
         
         
     """
-    samples = []
-
-    for visit in patient:
-
-        conditions = visit.get_code_list(table="diagnosis")
-        procedures = visit.get_code_list(table="physicalExam")
-        drugs = visit.get_code_list(table="medication")
-        # exclude: visits without condition, procedure, and drug code
-        if len(conditions) + len(procedures) + len(drugs) == 0:
-            continue
-
-        los_days = (visit.discharge_time - visit.encounter_time).days
-        los_category = categorize_los(los_days)
-
-        # TODO: should also exclude visit with age < 18
-        samples.append(
-            {
-                "visit_id": visit.visit_id,
-                "patient_id": patient.patient_id,
-                "conditions": [conditions],
-                "procedures": [procedures],
-                "drugs": [drugs],
-                "label": los_category,
-            }
+    return list(
+        _length_of_stay_samples(
+            patient,
+            condition_table="diagnosis",
+            procedure_table="physicalExam",
+            drug_table="medication",
         )
-    # no cohort selection
-    return samples
+    )
 
 
 def length_of_stay_prediction_omop_fn(patient: Patient):
@@ -238,33 +225,14 @@ def length_of_stay_prediction_omop_fn(patient: Patient):
         [{'visit_id': '130744', 'patient_id': '103', 'conditions': [['42', '109', '98', '663', '58', '51']], 'procedures': [['1']], 'label': 7}]
         
     """
-    samples = []
-
-    for visit in patient:
-
-        conditions = visit.get_code_list(table="condition_occurrence")
-        procedures = visit.get_code_list(table="procedure_occurrence")
-        drugs = visit.get_code_list(table="drug_exposure")
-        # exclude: visits without condition, procedure, and drug code
-        if len(conditions) + len(procedures) + len(drugs) == 0:
-            continue
-
-        los_days = (visit.discharge_time - visit.encounter_time).days
-        los_category = categorize_los(los_days)
-
-        # TODO: should also exclude visit with age < 18
-        samples.append(
-            {
-                "visit_id": visit.visit_id,
-                "patient_id": patient.patient_id,
-                "conditions": [conditions],
-                "procedures": [procedures],
-                "drugs": [drugs],
-                "label": los_category,
-            }
+    return list(
+        _length_of_stay_samples(
+            patient,
+            condition_table="condition_occurrence",
+            procedure_table="procedure_occurrence",
+            drug_table="drug_exposure",
         )
-        # no cohort selection
-    return samples
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,8 @@
-from typing import List, Optional, Tuple
+import sys
+from operator import itemgetter
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
 
 
 class Vocabulary:
@@ -27,17 +31,28 @@ class Vocabulary:
             special_tokens = []
         all_tokens = special_tokens + tokens
         self.token2idx = {}
-        self.idx2token = {}
-        self.idx = 0
+        # indices are dense, so a list is enough for the reverse lookup
+        self.idx2token = []
+        # indices of <unk> and <pad>, None if they are not in the vocabulary
+        self._unk_id = None
+        self._pad_id = None
         for token in all_tokens:
             self.add_token(token)
 
     def add_token(self, token):
         """Add a token to the vocabulary."""
         if token not in self.token2idx:
-            self.token2idx[token] = self.idx
-            self.idx2token[self.idx] = token
-            self.idx += 1
+            if isinstance(token, str):
+                # codes from Event are interned too, so lookups of them hit the
+                # key by identity without comparing the strings
+                token = sys.intern(token)
+            idx = len(self.idx2token)
+            self.token2idx[token] = idx
+            self.idx2token.append(token)
+            if token == "<unk>":
+                self._unk_id = idx
+            elif token == "<pad>":
+                self._pad_id = idx
 
     def __call__(self, token):
         """Retrieve the index of the token.
@@ -45,12 +60,10 @@ class Vocabulary:
         Note that if the token is not in the vocabulary, this function will try to return the index of <unk>.
         If <unk> is not in the vocabulary, an exception will be raised.
         """
-        if token not in self.token2idx:
-            if "<unk>" in self.token2idx:
-                return self.token2idx["<unk>"]
-            else:
-                raise ValueError("Unknown token: {}".format(token))
-        return self.token2idx[token]
+        idx = self.token2idx.get(token, self._unk_id)
+        if idx is None:
+            raise ValueError("Unknown token: {}".format(token))
+        return idx
 
     def __len__(self):
         """Return the size of the vocabulary."""
@@ -134,15 +147,39 @@ class Tokenizer:
 
     """
 
-    def __init__(self, tokens: List[str], special_tokens: Optional[List[str]] = None):
+    def __init__(
+        self,
+        tokens: List[str],
+        special_tokens: Optional[List[str]] = None,
+        row_cache_size: int = 0,
+    ):
         """Initialize the tokenizer.
 
         Args:
             tokens: List of tokens in the vocabulary.
             special_tokens: List of special tokens to add to the vocabulary. (e.g., <pad>, <unk>). If not provided,
                 no special tokens are added.
+            row_cache_size: maximum number of encoded rows (or visits) that batch_encode_2d/3d keep and reuse
+                when the same row is encoded again, e.g., in the next epoch. The cache is cleared once full.
+                Default is 0 (no caching).
         """
         self.vocabulary = Vocabulary(tokens=tokens, special_tokens=special_tokens)
+        # object array of the tokens for decoding numpy input, built on first use
+        self._idx2token_array = None
+        self.row_cache_size = row_cache_size
+        # tuple of tokens -> encoded indices, valid for _row_cache_vocab_size
+        self._row_cache = {}
+        self._row_cache_vocab_size = len(self.vocabulary)
+
+    @property
+    def pad_id(self) -> Optional[int]:
+        """Index of <pad>, None if <pad> is not in the vocabulary."""
+        return self.vocabulary._pad_id
+
+    @property
+    def unk_id(self) -> Optional[int]:
+        """Index of <unk>, None if <unk> is not in the vocabulary."""
+        return self.vocabulary._unk_id
 
     def get_vocabulary_size(self):
         """Return the size of the vocabulary."""
@@ -150,11 +187,24 @@ class Tokenizer:
 
     def convert_tokens_to_indices(self, tokens: List[str]) -> List[int]:
         """Convert a list of tokens to indices."""
-        return [self.vocabulary(token) for token in tokens]
+        # bind the lookup once and do a single dict probe per token, falling back
+        # to <unk> (None if there is no <unk> in the vocabulary)
+        token2idx_get = self.vocabulary.token2idx.get
+        unk_id = self.unk_id
+        indices = [token2idx_get(token, unk_id) for token in tokens]
+        if unk_id is None and None in indices:
+            raise ValueError("Unknown token: {}".format(tokens[indices.index(None)]))
+        return indices
 
     def convert_indices_to_tokens(self, indices: List[int]) -> List[str]:
-        """Convert a list of indices to tokens."""
-        return [self.vocabulary.idx2token[idx] for idx in indices]
+        """Convert a list of indices (or a 1D integer np.ndarray) to tokens."""
+        if isinstance(indices, np.ndarray):
+            return self._take_tokens(indices).tolist()
+        idx2token = self.vocabulary.idx2token
+        if len(indices) < 2:
+            # itemgetter returns a bare item instead of a tuple for a single index
+            return [idx2token[idx] for idx in indices]
+        return list(itemgetter(*indices)(idx2token))
 
     def batch_encode_2d(
         self,
@@ -162,6 +212,7 @@ class Tokenizer:
         padding: bool = True,
         truncation: bool = True,
         max_length: int = 512,
+        return_numpy: bool = False,
     ):
         """Convert a list of lists of tokens (2D) to indices.
 
@@ -170,17 +221,33 @@ class Tokenizer:
             padding: whether to pad the tokens to the max number of tokens in the batch (smart padding).
             truncation: whether to truncate the tokens to max_length.
             max_length: maximum length of the tokens. This argument is ignored if truncation is False.
+            return_numpy: whether to return a padded int64 array of shape (batch size, max length) instead
+                of nested lists. Requires padding to be True.
         """
-
-        if truncation:
-            batch = [tokens[:max_length] for tokens in batch]
-        if padding:
+        if return_numpy and not padding:
+            raise ValueError("return_numpy requires padding")
+        # encode and pad each row in one pass, in index space, so no "<pad>"
+        # strings are built and looked up again
+        encode_row = self._get_row_encoder()
+        limit = max_length if truncation else None
+        if padding and not return_numpy:
             batch_max_length = max([len(tokens) for tokens in batch])
-            batch = [
-                tokens + ["<pad>"] * (batch_max_length - len(tokens))
-                for tokens in batch
-            ]
-        return [[self.vocabulary(token) for token in tokens] for tokens in batch]
+            if limit is not None:
+                batch_max_length = min(batch_max_length, limit)
+            encoded = []
+            pad_id = None
+            for tokens in batch:
+                indices = encode_row(tokens[:limit])
+                if len(indices) < batch_max_length:
+                    if pad_id is None:
+                        pad_id = self._get_pad_id()
+                    indices.extend([pad_id] * (batch_max_length - len(indices)))
+                encoded.append(indices)
+        else:
+            encoded = [encode_row(tokens[:limit]) for tokens in batch]
+        if return_numpy:
+            return self._to_numpy_2d(encoded)
+        return encoded
 
     def batch_decode_2d(
         self,
@@ -190,13 +257,23 @@ class Tokenizer:
         """Convert a list of lists of indices (2D) to tokens.
 
         Args:
-            batch: List of lists of indices to convert to tokens.
+            batch: List of lists of indices (or a 2D integer np.ndarray) to convert to tokens.
             padding: whether to keep the padding tokens from the tokens.
         """
-        batch = [[self.vocabulary.idx2token[idx] for idx in tokens] for tokens in batch]
-        if not padding:
-            return [[token for token in tokens if token != "<pad>"] for tokens in batch]
-        return batch
+        if isinstance(batch, np.ndarray):
+            tokens, keep = self._decode_numpy(batch, padding)
+            if keep is None:
+                return tokens.tolist()
+            return [row[mask].tolist() for row, mask in zip(tokens, keep)]
+        idx2token = self.vocabulary.idx2token
+        pad_id = self.pad_id
+        if not padding and pad_id is not None:
+            # drop padding on the integer indices before looking up any token
+            return [
+                [idx2token[idx] for idx in indices if idx != pad_id]
+                for indices in batch
+            ]
+        return [[idx2token[idx] for idx in indices] for indices in batch]
 
     def batch_encode_3d(
         self,
@@ -204,6 +281,7 @@ class Tokenizer:
         padding: Tuple[bool, bool] = (True, True),
         truncation: Tuple[bool, bool] = (True, True),
         max_length: Tuple[int, int] = (10, 512),
+        return_numpy: bool = False,
     ):
         """Convert a list of lists of lists of tokens (3D) to indices.
 
@@ -215,32 +293,160 @@ class Tokenizer:
                 element in max_length
             max_length: a tuple of two integers indicating the maximum length of the tokens along the first and
                 second dimension. This argument is ignored if truncation is False.
+            return_numpy: whether to return a padded int64 array of shape (batch size, max visits,
+                max length) instead of nested lists. Requires padding on both dimensions.
         """
+        if return_numpy and not all(padding):
+            raise ValueError("return_numpy requires padding on both dimensions")
+        # encode and pad each visit in one pass, in index space, so no "<pad>"
+        # strings are built and looked up again
+        encode_row = self._get_row_encoder()
         if truncation[0]:
-            batch = [tokens[: max_length[0]] for tokens in batch]
-        if truncation[1]:
-            batch = [[tokens[: max_length[1]] for tokens in visits] for visits in batch]
-        if padding[0]:
-            batch_max_length = max([len(tokens) for tokens in batch])
-            batch = [
-                tokens + [["<pad>"]] * (batch_max_length - len(tokens))
-                for tokens in batch
-            ]
-        if padding[1]:
+            batch = [visits[: max_length[0]] for visits in batch]
+        limit = max_length[1] if truncation[1] else None
+        pad_visits = padding[0] and not return_numpy
+        pad_tokens = padding[1] and not return_numpy
+        if pad_visits:
+            batch_max_visits = max([len(visits) for visits in batch])
+        if pad_tokens:
             batch_max_length = max(
-                [max([len(tokens) for tokens in visits]) for visits in batch]
+                [len(tokens) for visits in batch for tokens in visits], default=0
             )
-            batch = [
-                [
-                    tokens + ["<pad>"] * (batch_max_length - len(tokens))
-                    for tokens in visits
-                ]
-                for visits in batch
+            if limit is not None:
+                batch_max_length = min(batch_max_length, limit)
+            if pad_visits and any(len(visits) < batch_max_visits for visits in batch):
+                # padded visits hold at least one <pad>
+                batch_max_length = max(batch_max_length, 1)
+            encoded = []
+            pad_id = None
+            for visits in batch:
+                encoded_visits = []
+                for tokens in visits:
+                    indices = encode_row(tokens[:limit])
+                    if len(indices) < batch_max_length:
+                        if pad_id is None:
+                            pad_id = self._get_pad_id()
+                        indices.extend([pad_id] * (batch_max_length - len(indices)))
+                    encoded_visits.append(indices)
+                encoded.append(encoded_visits)
+        else:
+            encoded = [
+                [encode_row(tokens[:limit]) for tokens in visits] for visits in batch
             ]
-        return [
-            [[self.vocabulary(token) for token in tokens] for tokens in visits]
+        if return_numpy:
+            return self._to_numpy_3d(encoded)
+        if pad_visits:
+            short = [visits for visits in encoded if len(visits) < batch_max_visits]
+            if short:
+                pad_id = self._get_pad_id()
+                visit_length = batch_max_length if pad_tokens else 1
+                for visits in short:
+                    visits.extend(
+                        [
+                            [pad_id] * visit_length
+                            for _ in range(batch_max_visits - len(visits))
+                        ]
+                    )
+        return encoded
+
+    def _get_row_encoder(self) -> Callable[[List[str]], List[int]]:
+        """Return the function encoding each row of a batch, chosen once per batch.
+
+        The returned function gives a fresh list, which the caller may pad in place.
+        Cached rows are dropped when the vocabulary has grown since they were encoded.
+        """
+        if self.row_cache_size > 0:
+            if self._row_cache_vocab_size != len(self.vocabulary):
+                self._row_cache.clear()
+                self._row_cache_vocab_size = len(self.vocabulary)
+            return self._encode_cached
+        unk_id = self.unk_id
+        if unk_id is None:
+            # unknown tokens have to raise, which convert_tokens_to_indices checks
+            return self.convert_tokens_to_indices
+        token2idx_get = self.vocabulary.token2idx.get
+
+        def encode_row(tokens):
+            return [token2idx_get(token, unk_id) for token in tokens]
+
+        return encode_row
+
+    def _encode_cached(self, tokens: List[str]) -> List[int]:
+        """Encode a row through the row cache; returns a fresh list the caller may pad in place."""
+        key = tuple(tokens)
+        indices = self._row_cache.get(key)
+        if indices is None:
+            indices = self.convert_tokens_to_indices(tokens)
+            if len(self._row_cache) >= self.row_cache_size:
+                self._row_cache.clear()
+            self._row_cache[key] = indices
+        return indices[:]
+
+    def _get_pad_id(self) -> int:
+        """Return the index used for padding.
+
+        Like any other token, <pad> falls back to <unk> if it is not in the vocabulary.
+        """
+        if self.pad_id is not None:
+            return self.pad_id
+        return self.vocabulary("<pad>")
+
+    def _to_numpy_2d(self, batch: List[List[int]]) -> np.ndarray:
+        """Copy encoded rows into one array pre-filled with the <pad> index."""
+        batch_max_length = max([len(indices) for indices in batch])
+        pad_id = 0
+        if any(len(indices) < batch_max_length for indices in batch):
+            pad_id = self._get_pad_id()
+        out = np.full((len(batch), batch_max_length), pad_id, dtype=np.int64)
+        for i, indices in enumerate(batch):
+            out[i, : len(indices)] = indices
+        return out
+
+    def _to_numpy_3d(self, batch: List[List[List[int]]]) -> np.ndarray:
+        """Copy encoded visits into one array pre-filled with the <pad> index."""
+        batch_max_visits = max([len(visits) for visits in batch])
+        batch_max_length = max(
+            [len(indices) for visits in batch for indices in visits], default=0
+        )
+        if any(len(visits) < batch_max_visits for visits in batch):
+            # padded visits hold at least one <pad>, as in the list output
+            batch_max_length = max(batch_max_length, 1)
+        pad_id = 0
+        if any(
+            len(visits) < batch_max_visits
+            or any(len(indices) < batch_max_length for indices in visits)
             for visits in batch
-        ]
+        ):
+            pad_id = self._get_pad_id()
+        out = np.full(
+            (len(batch), batch_max_visits, batch_max_length), pad_id, dtype=np.int64
+        )
+        for i, visits in enumerate(batch):
+            for j, indices in enumerate(visits):
+                out[i, j, : len(indices)] = indices
+        return out
+
+    def _take_tokens(self, indices: np.ndarray) -> np.ndarray:
+        """Gather the tokens of an index array from an object array of the vocabulary."""
+        vocab_size = len(self.vocabulary)
+        if self._idx2token_array is None or len(self._idx2token_array) != vocab_size:
+            self._idx2token_array = np.empty(vocab_size, dtype=object)
+            self._idx2token_array[:] = self.vocabulary.idx2token
+        if indices.size and indices.min() < 0:
+            # negative indices would silently wrap around in numpy
+            raise IndexError("index {} is out of range".format(indices.min()))
+        return self._idx2token_array[indices]
+
+    def _decode_numpy(self, batch: np.ndarray, padding: bool):
+        """Look up the tokens of an index array with one fancy-indexing pass.
+
+        Returns the object array of tokens and a boolean mask of the non-padding
+        positions, or None for the mask if nothing has to be dropped.
+        """
+        tokens = self._take_tokens(batch)
+        if padding or self.pad_id is None:
+            return tokens, None
+        return tokens, batch != self.pad_id
 
     def batch_decode_3d(
         self,
@@ -250,15 +456,37 @@ class Tokenizer:
         """Convert a list of lists of lists of indices (3D) to tokens.
 
         Args:
-            batch: List of lists of lists of indices to convert to tokens.
+            batch: List of lists of lists of indices (or a 3D integer np.ndarray) to convert to tokens.
             padding: whether to keep the padding tokens from the tokens.
         """
-        batch = [
-            self.batch_decode_2d(batch=visits, padding=padding) for visits in batch
-        ]
-        if not padding:
-            batch = [[visit for visit in visits if visit != []] for visits in batch]
-        return batch
+        if isinstance(batch, np.ndarray):
+            tokens, keep = self._decode_numpy(batch, padding)
+            if padding:
+                return tokens.tolist()
+            if keep is None:
+                return [[row for row in visits.tolist() if row] for visits in tokens]
+            decoded = []
+            for visits, masks in zip(tokens, keep):
+                rows = [row[mask].tolist() for row, mask in zip(visits, masks)]
+                decoded.append([row for row in rows if row])
+            return decoded
+        idx2token = self.vocabulary.idx2token
+        if padding:
+            return [
+                [[idx2token[idx] for idx in indices] for indices in visits]
+                for visits in batch
+            ]
+        # drop padding and the visits left empty in the same pass
+        pad_id = self.pad_id
+        decoded = []
+        for visits in batch:
+            decoded_visits = []
+            for indices in visits:
+                tokens = [idx2token[idx] for idx in indices if idx != pad_id]
+                if tokens:
+                    decoded_visits.append(tokens)
+            decoded.append(decoded_visits)
+        return decoded
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import logging
 import os
+from contextlib import nullcontext
 from typing import Dict, Type, Optional
 import pickle
 import torch
@@ -85,6 +86,7 @@ class Trainer:
         epochs: int = 1,
         max_grad_norm: float = None,
         show_progress_bar: bool = True,
+        use_amp: bool = False,
     ):
         """Arguments for fitting to train the ML model
         Args:
@@ -100,6 +102,9 @@ class Trainer:
             mode: "binary" or "multiclass" or "multilabel"
             epochs: number of epochs
             show_progress_bar: show progress bar
+            use_amp: run the forward pass in mixed precision (bfloat16 if the GPU
+                supports it, otherwise float16 with loss scaling). The weights are
+                kept in float32. Requires the trainer device to be a CUDA device.
         """
         if model.__class__.__name__ == "ClassicML":
             model.fit(
@@ -145,6 +150,26 @@ class Trainer:
                 optimizer_grouped_parameters, **optimizer_params
             )
 
+            amp_dtype = None
+            scaler = None
+            if use_amp:
+                # autocast and the scaler below only act on CUDA, so check the
+                # device the model runs on, not just whether a GPU is present
+                if self.device is None or torch.device(self.device).type != "cuda":
+                    raise ValueError(
+                        "use_amp requires a CUDA device, got {}".format(self.device)
+                    )
+                if torch.cuda.is_bf16_supported():
+                    amp_dtype = torch.bfloat16
+                else:
+                    # float16 gradients can underflow, so scale the loss
+                    amp_dtype = torch.float16
+                    if hasattr(torch, "amp") and hasattr(torch.amp, "GradScaler"):
+                        scaler = torch.amp.GradScaler("cuda")
+                    else:
+                        # torch < 2.3 only has the CUDA-specific scaler
+                        scaler = torch.cuda.amp.GradScaler()
+
             data_iterator = iter(train_loader)
             best_score = -1 * float("inf") if mode == "max" else float("inf")
             global_step = 0
@@ -169,14 +194,28 @@ class Trainer:
                         data_iterator = iter(train_loader)
                         data = next(data_iterator)
 
-                    output = model(**data, device=self.device, training=True)
+                    if use_amp:
+                        autocast = torch.autocast(device_type="cuda", dtype=amp_dtype)
+                    else:
+                        autocast = nullcontext()
+                    with autocast:
+                        output = model(**data, device=self.device, training=True)
                     loss = output["loss"]
-                    loss.backward()
+                    if scaler is not None:
+                        scaler.scale(loss).backward()
+                        # clip the true gradients, not the scaled ones
+                        scaler.unscale_(optimizer)
+                    else:
+                        loss.backward()
                     if max_grad_norm is not None:
                         torch.nn.utils.clip_grad_norm_(
                             model.parameters(), max_grad_norm
                         )
-                    optimizer.step()
+                    if scaler is not None:
+                        scaler.step(optimizer)
+                        scaler.update()
+                    else:
+                        optimizer.step()
 
                     optimizer.zero_grad()
 